@@ -0,0 +1,158 @@
+"""
+Select the jit-tests that exercise the sources touched by the current diff.
+
+Selection starts from a hand-written map of source paths to jit-test
+directories and is extended by the failure history of earlier runs: every time
+a jit-test fails we remember which source directories were being changed at
+the time.
+"""
+
+import json
+import os.path
+import subprocess
+
+import lib
+
+HistoryFile = os.path.join(lib.StateDir, 'jit-test-history.json')
+
+# Source path prefixes and the jit-test directories that exercise them. An
+# empty list means the path cannot affect jit-tests at all.
+SeedMap = {
+    'js/src/gc': ['gc'],
+    'js/src/jsgc': ['gc'],
+    'js/src/jit': ['ion', 'baseline', 'asm.js'],
+    'js/src/asmjs': ['asm.js'],
+    'js/src/frontend': ['parser', 'basic'],
+    'js/src/builtin': ['collections', 'self-hosting', 'TypedObject'],
+    'js/src/vm/Debugger': ['debug'],
+    'js/src/vm': ['basic'],
+    'js/src/jsapi-tests': [],
+    'js/src/tests': [],
+}
+
+# Paths that everything depends on; touching these always runs the full suite.
+FullSuitePrefixes = (
+    'js/public',
+    'mfbt',
+    'js/src/configure',
+    'js/src/Makefile',
+    'js/src/moz.build',
+    'js/src/jsapi.',
+    'js/src/jit-test/jit_test.py',
+    'js/src/jit-test/lib',
+)
+
+# Above this many selected directories the full suite is barely more work.
+MaxSelected = 12
+
+TestsPrefix = 'js/src/jit-test/tests/'
+
+
+def source_root():
+    return subprocess.check_output(['hg', 'root']).decode('UTF-8').strip()
+
+
+def changed_files():
+    """
+    Return the files touched by the working directory, relative to the source
+    root. A clean working directory means we are testing the current patch.
+    """
+    root = source_root()
+    output = subprocess.check_output(['hg', 'status', '-mard', '-n'], cwd=root)
+    files = output.decode('UTF-8').split()
+    if not files:
+        output = subprocess.check_output(['hg', 'log', '-r', '.', '--template', '{files}'], cwd=root)
+        files = output.decode('UTF-8').split()
+    return [f.replace('\\', '/') for f in files]
+
+
+def try_changed_files():
+    """Like changed_files(), but None if there is no hg or no repository."""
+    try:
+        return changed_files()
+    except (OSError, subprocess.CalledProcessError) as e:
+        print("Cannot tell which files changed: {}".format(e))
+        return None
+
+
+def load_history():
+    if not os.path.exists(HistoryFile):
+        return {}
+    with open(HistoryFile) as fp:
+        return json.load(fp)
+
+
+def save_history(history):
+    if not os.path.isdir(lib.StateDir):
+        os.makedirs(lib.StateDir)
+    with open(HistoryFile, 'w') as fp:
+        json.dump(history, fp, indent=1, sort_keys=True)
+
+
+def lookup(path, history):
+    """
+    Return the test directories mapped to |path|, or None if nothing is known
+    about it.
+    """
+    if path.startswith(TestsPrefix):
+        return [path[len(TestsPrefix):].partition('/')[0]]
+
+    found = None
+    best = ''
+    for prefix, dirs in SeedMap.items():
+        if path.startswith(prefix) and len(prefix) > len(best):
+            best, found = prefix, list(dirs)
+
+    learned = history.get(os.path.dirname(path), {})
+    if learned:
+        found = (found or []) + [d for d in learned if d not in (found or [])]
+    return found
+
+
+def select(files, history):
+    """
+    Return the list of jit-test directories to run for |files|, or None if the
+    full suite has to run.
+    """
+    relevant = [f for f in files if f.startswith('js/') or f.startswith('mfbt/')]
+    if not relevant:
+        print("No changes under js/ or mfbt/: running the full suite.")
+        return None
+
+    selected = []
+    for path in relevant:
+        if path.startswith(FullSuitePrefixes):
+            print("{} affects everything: running the full suite.".format(path))
+            return None
+        dirs = lookup(path, history)
+        if dirs is None:
+            print("No jit-tests are known to cover {}: running the full suite.".format(path))
+            return None
+        selected += [d for d in dirs if d not in selected]
+
+    if len(selected) > MaxSelected:
+        print("{} test directories affected: running the full suite.".format(len(selected)))
+        return None
+    return selected
+
+
+def record_failures(files, failed_tests):
+    """
+    Remember that the tests in |failed_tests| failed while |files| were changed.
+    """
+    dirs = set()
+    for test in failed_tests:
+        test = test.replace('\\', '/')
+        _, _, rel = test.partition(TestsPrefix)
+        rel = rel or test
+        if '/' in rel:
+            dirs.add(rel.partition('/')[0])
+    if not dirs:
+        return
+
+    history = load_history()
+    for srcdir in set(os.path.dirname(f) for f in files if f.startswith('js/')):
+        counts = history.setdefault(srcdir, {})
+        for d in dirs:
+            counts[d] = counts.get(d, 0) + 1
+    save_history(history)
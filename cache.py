@@ -0,0 +1,141 @@
+"""
+A local cache of finished build artifacts.
+
+Entries are keyed by the source revision and the normalized configuration they
+were built from, so going back to a revision we have already built is a copy
+rather than a build. The cache is bounded in size and evicts the least
+recently used entries first.
+"""
+
+import hashlib
+import json
+import os
+import os.path
+import shutil
+import subprocess
+
+import lib
+
+CacheDir = os.path.join(lib.StateDir, 'artifacts')
+DefaultSizeGB = 20
+
+
+def tree_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            filepath = os.path.join(dirpath, filename)
+            if not os.path.islink(filepath):
+                total += os.path.getsize(filepath)
+    return total
+
+
+def copy_path(src, dst):
+    """Copy a file or directory, following symlinks into the objdir."""
+    if os.path.isdir(dst) and not os.path.islink(dst):
+        shutil.rmtree(dst)
+    elif os.path.lexists(dst):
+        os.unlink(dst)
+    parent = os.path.dirname(dst)
+    if parent and not os.path.isdir(parent):
+        os.makedirs(parent)
+    if os.path.isdir(src):
+        shutil.copytree(src, dst, symlinks=False)
+    else:
+        shutil.copy2(src, dst)
+
+
+def clone_tree(src, dst):
+    """
+    Copy the tree at |src| into |dst|, sharing data blocks through reflinks
+    where the filesystem supports them. Hardlinks would be no good here: the
+    compiler truncates and rewrites its outputs in place, which would write
+    through to |src| as well.
+    """
+    if not os.path.isdir(dst):
+        os.makedirs(dst)
+    try:
+        subprocess.check_call(['cp', '-a', '--reflink=auto', os.path.join(src, '.'), dst])
+        return
+    except (OSError, subprocess.CalledProcessError):
+        pass
+
+    # No GNU cp, or it gave up halfway: start over with a plain copy. |dst|
+    # itself may be a symlink target we must keep, so only empty it.
+    for name in os.listdir(dst):
+        path = os.path.join(dst, name)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.unlink(path)
+    shutil.copytree(src, dst, symlinks=True, dirs_exist_ok=True)
+
+
+class ArtifactCache:
+    def __init__(self, max_gb=DefaultSizeGB, root=CacheDir):
+        self.root = root
+        self.max_bytes = int(max_gb * 1024 ** 3)
+
+    @staticmethod
+    def key(revision, config):
+        blob = json.dumps({'revision': revision, 'config': config}, sort_keys=True)
+        return hashlib.sha1(blob.encode('UTF-8')).hexdigest()
+
+    def entry(self, key):
+        return os.path.join(self.root, key)
+
+    def restore(self, key, builddir):
+        """
+        Copy the artifacts stored under |key| into |builddir|. Returns False if
+        there is no such entry.
+        """
+        entry = self.entry(key)
+        if not os.path.isdir(entry):
+            return False
+
+        # Touch the entry so that eviction sees it as recently used.
+        os.utime(entry, None)
+        with open(os.path.join(entry, 'manifest.json')) as fp:
+            paths = json.load(fp)
+        for path in paths:
+            print("Restoring: {}".format(path))
+            copy_path(os.path.join(entry, 'files', path), os.path.join(builddir, path))
+        return True
+
+    def store(self, key, builddir, paths):
+        entry = self.entry(key)
+        if os.path.isdir(entry):
+            os.utime(entry, None)
+            return
+
+        # Assemble the entry next to its final location and rename it into
+        # place, so that an interrupted store never leaves a partial entry.
+        tmp = '{}.tmp-{}'.format(entry, os.getpid())
+        stored = []
+        for path in paths:
+            if os.path.exists(os.path.join(builddir, path)):
+                copy_path(os.path.join(builddir, path), os.path.join(tmp, 'files', path))
+                stored.append(path)
+        if not stored:
+            return
+        with open(os.path.join(tmp, 'manifest.json'), 'w') as fp:
+            json.dump(stored, fp)
+        os.rename(tmp, entry)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if '.tmp-' not in name and os.path.isdir(path):
+                entries.append((os.path.getmtime(path), tree_size(path), path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        while entries and total > self.max_bytes:
+            _, size, path = entries.pop(0)
+            print("Evicting cached artifacts: {}".format(os.path.basename(path)))
+            shutil.rmtree(path)
+            total -= size
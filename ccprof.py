@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Profile the compile and link commands of a build.
+
+Run as a program, this is a compiler wrapper: the .ccprof shortcut passes it
+to configure with --with-compiler-wrapper, after which it runs every compile
+and link command and appends the wall time and peak memory of the command to
+the file named by $WFM_CCPROF_LOG. Without that variable, e.g. while
+configure is probing the compiler, it just runs the command.
+
+Run as one of LinkerNames, it is a linker wrapper instead: wfm points
+$COMPILER_PATH, which gcc and clang search for their linker before $PATH, at
+a directory of such links for every build without .ccprof, and the wrapper
+appends the link times to $WFM_LINK_LOG.
+
+Imported, it reads those records back and reports the slowest translation
+units, headers and directories of one context, or compares two. The link
+times of each build also end up in wfm's resource report.
+"""
+
+import json
+import os
+import os.path
+import subprocess
+import sys
+import time
+
+SourceExtensions = ('.c', '.cc', '.cpp', '.cxx', '.m', '.mm', '.s', '.S')
+
+NotLinkFlags = ('-E', '-S', '-M', '-MM')
+
+WrapperPath = os.path.realpath(__file__)
+
+LogName = 'ccprof.jsonl'
+
+LinkLogName = 'links.jsonl'
+
+LinkerNames = ('ld', 'ld.bfd', 'ld.gold', 'ld.lld')
+
+
+def is_clang(compiler):
+    return os.path.basename(compiler).startswith('clang')
+
+
+def supports_time_trace(compiler):
+    """Check whether |compiler| is a clang that understands -ftime-trace."""
+    if not is_clang(compiler):
+        return False
+    try:
+        subprocess.check_call([compiler, '-ftime-trace', '-x', 'c', '-c', os.devnull,
+                               '-o', os.devnull],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return True
+
+
+def wrap(command):
+    log = os.environ.get('WFM_CCPROF_LOG')
+    if not log:
+        return subprocess.call(command)
+
+    # Not available on Windows, where there is nothing to wrap anyway.
+    import resource
+
+    # Preprocessing, dependency and version queries are neither compiles nor
+    # links; run them without a record.
+    is_compile = '-c' in command
+    output = command[command.index('-o') + 1] if '-o' in command[:-1] else None
+    if not is_compile and (output is None or any(arg in NotLinkFlags for arg in command)):
+        return subprocess.call(command)
+
+    source = ([arg for arg in command[1:] if arg.endswith(SourceExtensions)] or [None])[0]
+    trace = None
+    if is_compile and output and os.environ.get('WFM_CCPROF_TIMETRACE') and is_clang(command[0]):
+        command = command + ['-ftime-trace']
+        trace = os.path.abspath(os.path.splitext(output)[0] + '.json')
+
+    start = time.time()
+    returncode = subprocess.call(command)
+    record = {
+        'kind': 'compile' if is_compile else 'link',
+        'start': round(start, 3),
+        'source': source,
+        'output': output,
+        'cwd': os.getcwd(),
+        'wall': round(time.time() - start, 3),
+        'rss': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024,
+        'trace': trace,
+        'status': returncode,
+    }
+
+    append(log, record)
+    return returncode
+
+
+def append(log, record):
+    # One write per record on an O_APPEND file keeps parallel compiles from
+    # interleaving their lines.
+    fd = os.open(log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, (json.dumps(record) + '\n').encode('UTF-8'))
+    finally:
+        os.close(fd)
+
+
+def find_linker(name, skip):
+    """Return the real linker |name| from $PATH, ignoring the directory |skip|."""
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        path = os.path.join(directory, name)
+        if os.path.realpath(directory) != skip and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def wrap_linker(name, args):
+    linkers = os.path.dirname(os.path.abspath(sys.argv[0]))
+    linker = find_linker(name, os.path.realpath(linkers))
+    if linker is None:
+        print("ccprof: no {} on $PATH".format(name), file=sys.stderr)
+        return 1
+
+    # Keep the linker from finding us again, e.g. lld running as ld.
+    paths = os.environ.get('COMPILER_PATH', '').split(os.pathsep)
+    os.environ['COMPILER_PATH'] = os.pathsep.join(p for p in paths
+                                                  if os.path.realpath(p) != os.path.realpath(linkers))
+
+    log = os.environ.get('WFM_LINK_LOG')
+    if not log:
+        return subprocess.call([linker] + args)
+
+    import resource
+
+    start = time.time()
+    returncode = subprocess.call([linker] + args)
+    append(log, {
+        'kind': 'link',
+        'start': round(start, 3),
+        'source': None,
+        'output': args[args.index('-o') + 1] if '-o' in args[:-1] else None,
+        'cwd': os.getcwd(),
+        'wall': round(time.time() - start, 3),
+        'rss': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024,
+        'trace': None,
+        'status': returncode,
+    })
+    return returncode
+
+
+def load(builddir):
+    """
+    Return the records of |builddir|, keyed by the objdir relative path of
+    their output, so that rebuilding a file replaces its old record.
+    """
+    objdir = os.path.realpath(builddir)
+    records = {}
+    with open(os.path.join(builddir, '.wfm', LogName)) as fp:
+        for line in fp:
+            record = json.loads(line)
+            record['dir'] = os.path.relpath(record['cwd'], objdir)
+            name = record['output'] or record['source'] or '?'
+            record['name'] = os.path.normpath(os.path.join(record['dir'], name))
+            records[record['name']] = record
+    return records
+
+
+def links_since(builddir, since):
+    """
+    Return (output, seconds) for every link recorded in |builddir|, by either
+    wrapper, that started at or after the time |since|.
+    """
+    links = []
+    for name in (LogName, LinkLogName):
+        path = os.path.join(builddir, '.wfm', name)
+        if not os.path.exists(path):
+            continue
+        with open(path) as fp:
+            for line in fp:
+                record = json.loads(line)
+                if record['kind'] == 'link' and record.get('start', 0) >= since:
+                    links.append((record['output'] or '?', record['wall']))
+    return links
+
+
+def header_times(records):
+    """
+    Sum the time clang spent parsing each header, from the -ftime-trace files.
+    A header's time excludes the headers it includes, which get their own.
+    """
+    headers = {}
+    for record in records.values():
+        if not record['trace'] or not os.path.exists(record['trace']):
+            continue
+        with open(record['trace']) as fp:
+            events = json.load(fp).get('traceEvents', [])
+        sources = [e for e in events if e.get('name') == 'Source']
+        sources.sort(key=lambda e: (e['ts'], -e['dur']))
+        stack = []
+        for event in sources:
+            while stack and stack[-1]['ts'] + stack[-1]['dur'] <= event['ts']:
+                stack.pop()
+            header = event['args']['detail']
+            headers[header] = headers.get(header, 0.0) + event['dur'] / 1e6
+            if stack:
+                parent = stack[-1]['args']['detail']
+                headers[parent] -= event['dur'] / 1e6
+            stack.append(event)
+    return headers
+
+
+def directory_times(records):
+    dirs = {}
+    for record in records.values():
+        if record['kind'] == 'compile':
+            dirs[record['dir']] = dirs.get(record['dir'], 0.0) + record['wall']
+    return dirs
+
+
+def top(items, count):
+    return sorted(items, key=lambda item: item[1], reverse=True)[:count]
+
+
+def report(builddir, count=20):
+    records = load(builddir)
+    compiles = [r for r in records.values() if r['kind'] == 'compile']
+    links = [r for r in records.values() if r['kind'] == 'link']
+
+    print("{} compiles, {:.1f}s total; {} links, {:.1f}s total".format(
+          len(compiles), sum(r['wall'] for r in compiles),
+          len(links), sum(r['wall'] for r in links)))
+
+    print("\nSlowest translation units:")
+    for record in sorted(compiles, key=lambda r: r['wall'], reverse=True)[:count]:
+        print("{:>8.2f}s {:>8.0f}MiB  {}".format(record['wall'], record['rss'] / 1048576.0,
+                                                 os.path.join(record['dir'], record['source'] or '?')))
+
+    print("\nSlowest links:")
+    for record in sorted(links, key=lambda r: r['wall'], reverse=True)[:count]:
+        print("{:>8.2f}s {:>8.0f}MiB  {}".format(record['wall'], record['rss'] / 1048576.0,
+                                                 record['name']))
+
+    headers = header_times(records)
+    if headers:
+        print("\nMost expensive headers (self time, summed over all includes):")
+        for header, seconds in top(headers.items(), count):
+            print("{:>8.2f}s  {}".format(seconds, header))
+
+    print("\nCompile time by directory:")
+    for directory, seconds in top(directory_times(records).items(), count):
+        print("{:>8.2f}s  {}".format(seconds, directory))
+
+
+def compare(before, after, count=20):
+    dirs0 = directory_times(load(before))
+    dirs1 = directory_times(load(after))
+    print("{:40} | {:>9} | {:>9} | {:>8}".format('directory', before, after, 'delta'))
+    names = set(dirs0) | set(dirs1)
+    rows = [(d, dirs1.get(d, 0.0) - dirs0.get(d, 0.0)) for d in names]
+    for directory, delta in sorted(rows, key=lambda row: abs(row[1]), reverse=True)[:count]:
+        print("{:40} | {:>8.1f}s | {:>8.1f}s | {:>+7.1f}s".format(
+              directory, dirs0.get(directory, 0.0), dirs1.get(directory, 0.0), delta))
+
+
+if __name__ == '__main__':
+    name = os.path.basename(sys.argv[0])
+    if name in LinkerNames:
+        sys.exit(wrap_linker(name, sys.argv[1:]))
+    sys.exit(wrap(sys.argv[1:]))
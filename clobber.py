@@ -0,0 +1,119 @@
+"""
+Work out which parts of an objdir a configuration change invalidates.
+
+Most configure arguments end up in js-confdefs.h or the compiler flags, which
+every object depends on, so by default a change invalidates everything. The
+tables below list the changes we know to be narrower.
+"""
+
+import os
+import os.path
+import shutil
+
+Everything = None
+
+# Where the shell ends up in the objdir. Old and new layouts differ, so list
+# both.
+ShellPaths = ('shell', 'js/src/shell', 'js/src/js', 'dist/bin/js')
+
+# Stands for every program and shared library in the objdir. Make does not
+# relink when only the link flags change, so these have to go.
+LinkedOutputs = '<linked outputs>'
+
+LinkedSuffixes = ('.so', '.dylib', '.dll', '.exe')
+LinkedMagic = (b'\x7fELF', b'\xcf\xfa\xed\xfe', b'\xce\xfa\xed\xfe')
+
+# Configure features, as in --enable-FEATURE or --with-FEATURE, that only
+# invalidate part of the objdir.
+ArgumentScopes = {
+    'readline': ShellPaths,
+    'editline': ShellPaths,
+    'xterm-updates': ShellPaths,
+    'strip': ('dist/bin',),
+    'install-strip': ('dist/bin',),
+    'ccache': (),
+    'compiler-wrapper': (),
+}
+
+# Likewise for environment variables.
+EnvironmentScopes = {
+    'CCACHE_CC': (),
+    'CCACHE_CPP2': (),
+    'CCACHE_UNIFY': (),
+    'LDFLAGS': (LinkedOutputs,),
+}
+
+
+def feature(arg):
+    for prefix in ('--enable-', '--disable-', '--without-', '--with-'):
+        if arg.startswith(prefix):
+            return arg[len(prefix):].partition('=')[0]
+    return arg
+
+
+def invalidated(old, new):
+    """
+    Return the objdir paths that a change of the normalized configuration from
+    |old| to |new| invalidates, or Everything.
+    """
+    paths = set()
+    for arg in set(old['arguments']) ^ set(new['arguments']):
+        scope = ArgumentScopes.get(feature(arg), Everything)
+        if scope is Everything:
+            return Everything
+        paths.update(scope)
+
+    old_env, new_env = old['environment'], new['environment']
+    for key in set(old_env) | set(new_env):
+        if old_env.get(key) != new_env.get(key):
+            scope = EnvironmentScopes.get(key, Everything)
+            if scope is Everything:
+                return Everything
+            paths.update(scope)
+    return sorted(paths)
+
+
+def is_linked(path):
+    """Check whether |path| is a program or shared library, not an object."""
+    if path.endswith(LinkedSuffixes):
+        return True
+    if not os.access(path, os.X_OK):
+        return False
+    try:
+        with open(path, 'rb') as fp:
+            return fp.read(4) in LinkedMagic
+    except (IOError, OSError):
+        return False
+
+
+def linked_outputs(objdir):
+    """
+    Return the objdir relative paths of all programs and shared libraries,
+    and of the symlinks that install them into dist/.
+    """
+    found = []
+    links = []
+    for dirpath, _, filenames in os.walk(objdir):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if os.path.islink(path):
+                links.append(path)
+            elif is_linked(path):
+                found.append(path)
+    targets = set(os.path.realpath(path) for path in found)
+    found += [path for path in links if os.path.realpath(path) in targets]
+    return [os.path.relpath(path, objdir) for path in found]
+
+
+def clobber(objdir, paths, keep=('.wfm',)):
+    """Delete |paths| from |objdir|, or all of it but |keep| for Everything."""
+    if paths is Everything:
+        paths = [name for name in os.listdir(objdir) if name not in keep]
+    elif LinkedOutputs in paths:
+        paths = [path for path in paths if path != LinkedOutputs] + linked_outputs(objdir)
+    for path in paths:
+        path = os.path.join(objdir, path)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        elif os.path.lexists(path):
+            os.unlink(path)
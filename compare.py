@@ -1,31 +1,123 @@
 #!/usr/bin/python3
+"""
+Compare benchmark results: a baseline file against one or more candidates.
+
+Each file holds "name: value" lines. Rows are joined on the name, so results
+may come in any order and a name missing from some of the files is shown as
+missing rather than breaking the comparison.
+"""
+import argparse
+import collections
+import csv
+import json
 import sys
 
-def asPairs(fp):
-    out = []
+def iterPairs(fp):
     for line in fp:
+        line = line.strip()
         if not line or line.startswith('-'):
             continue
         before, _, after = line.partition(": ")
-        out.append((before.strip(), after.strip()))
-    return out
+        yield before.strip(), after.strip()
+
+def asPairs(fp):
+    return list(iterPairs(fp))
+
+def number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def delta(v0, v1):
+    v0, v1 = number(v0), number(v1)
+    if v0 is None or v1 is None or v0 == 0:
+        return None
+    return (v1 - v0) / v0 * 100.0
+
+def join(paths):
+    """
+    Read the files one line at a time and return an ordered map of each name to
+    its value in every file, None where a file does not have it.
+    """
+    table = collections.OrderedDict()
+    for i, path in enumerate(paths):
+        with open(path) as fp:
+            for key, value in iterPairs(fp):
+                row = table.get(key)
+                if row is None:
+                    row = table[key] = [None] * len(paths)
+                row[i] = value
+    return table
 
-with open(sys.argv[1]) as fp:
-    out0 = asPairs(fp)
-with open(sys.argv[2]) as fp:
-    out1 = asPairs(fp)
+def rows(table):
+    for key, values in table.items():
+        yield key, values, [delta(values[0], v) for v in values[1:]]
 
 def red():   print("\x1b[31;2m", end='')
 def green(): print("\x1b[32;2m", end='')
 def reset(): print("\x1b[0m", end='')
 
-assert len(out0) == len(out1)
-for i, (k0, v0) in enumerate(out0):
-    k1, v1 = out1[i]
-    assert k0 == k1
-    delta = (int(v1) - int(v0)) / float(v0) * 100.0
-    print("{:17} | {:>6} -> {:>6} = ".format(k0, v0, v1), end='')
-    if delta > 0: green()
-    else: red()
-    print("{:=+7.02f}%".format(delta))
-    reset()
+def show_table(paths, table):
+    width = max([17] + [len(key) for key in table])
+    for key, values, deltas in rows(table):
+        print("{:{}} | {:>8}".format(key, width, values[0] or '-'), end='')
+        for value, d in zip(values[1:], deltas):
+            print(" -> {:>8} = ".format(value or '-'), end='')
+            if d is None:
+                print("{:>8}".format('-'), end='')
+                continue
+            if d > 0: green()
+            else: red()
+            print("{:=+7.02f}%".format(d), end='')
+            reset()
+        print()
+
+def write_json(paths, table, fp):
+    results = [{'name': key, 'values': [number(v) if number(v) is not None else v for v in values],
+                'deltas': deltas}
+               for key, values, deltas in rows(table)]
+    json.dump({'files': paths, 'results': results}, fp, indent=1)
+    fp.write('\n')
+
+def write_csv(paths, table, fp):
+    writer = csv.writer(fp)
+    header = ['name', paths[0]]
+    for path in paths[1:]:
+        header += [path, path + ' delta%']
+    writer.writerow(header)
+    for key, values, deltas in rows(table):
+        row = [key, values[0]]
+        for value, d in zip(values[1:], deltas):
+            row += [value, '' if d is None else '{:.2f}'.format(d)]
+        writer.writerow(row)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare benchmark results.')
+    parser.add_argument('baseline', help='The results to compare against.')
+    parser.add_argument('candidates', nargs='+', help='The results to compare.')
+    parser.add_argument('--format', '-f', choices=('table', 'json', 'csv'), default='table',
+                        help='Output format.')
+    parser.add_argument('--output', '-o', metavar='FILE',
+                        help='Write to FILE instead of stdout.')
+    args = parser.parse_args()
+
+    if args.output and args.format == 'table':
+        parser.error('--output needs --format json or csv')
+
+    paths = [args.baseline] + args.candidates
+    table = join(paths)
+    if args.format == 'table':
+        show_table(paths, table)
+        return 0
+
+    write = write_json if args.format == 'json' else write_csv
+    if not args.output:
+        write(paths, table, sys.stdout)
+        return 0
+    with open(args.output, 'w', newline='') as fp:
+        write(paths, table, fp)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,13 @@
 import argparse
+import concurrent.futures
 import multiprocessing
 import os.path
+import subprocess
 import sys
 
+# Where wfm keeps state that outlives a single context, e.g. test history.
+StateDir = os.path.expanduser(os.path.join('~', '.wfm'))
+
 def get_jobcount(specified):
     if specified > 0:
         return specified
@@ -15,6 +20,35 @@ def get_jobcount(specified):
 
     return multiprocessing.cpu_count()
 
+def source_revision():
+    """
+    Return the revision of the source tree we are in, or None if there is no
+    revision that describes it, e.g. because of local changes.
+    """
+    try:
+        revision = subprocess.check_output(['hg', 'id', '-i'], stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    revision = revision.decode('UTF-8').strip()
+    if not revision or revision.endswith('+'):
+        return None
+    return revision
+
+def format_bytes(count):
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if count < 1024:
+            return "{:.1f}{}".format(count, unit)
+        count /= 1024.0
+    return "{:.1f}TiB".format(count)
+
+def parallel_map(function, items, n_jobs):
+    """
+    Return [function(item) for item in items], running at most n_jobs calls
+    at a time. Meant for functions that spend their time in a subprocess.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=get_jobcount(n_jobs)) as pool:
+        return list(pool.map(function, items))
+
 def setup_build_api(description):
     parser = argparse.ArgumentParser(description=description)
     parser.add_argument('builddir', metavar='CONTEXT', default='ctx', type=str, nargs='?',
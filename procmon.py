@@ -0,0 +1,202 @@
+"""
+Watch the processes wfm starts.
+
+While a phase runs, a background thread walks /proc for every descendant of
+wfm and records their CPU time, resident memory and I/O. Where there is no
+/proc we still know the wall and CPU time of the phase, but nothing else.
+
+A watchdog kills a process tree that runs too long, after saving backtraces
+of every thread in it.
+"""
+
+import json
+import os
+import os.path
+import signal
+import subprocess
+import threading
+import time
+
+try:
+    ClockTicks = os.sysconf('SC_CLK_TCK')
+    PageSize = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError):
+    ClockTicks, PageSize = 100, 4096
+
+Columns = ('time', 'cpu', 'rss', 'read_bytes', 'write_bytes', 'processes')
+
+
+def read_stat(pid):
+    """
+    Return (ppid, comm, cpu seconds, rss bytes) for |pid|, or None if it is gone.
+    CPU time includes the children the process has already reaped.
+    """
+    try:
+        with open('/proc/{}/stat'.format(pid)) as fp:
+            stat = fp.read()
+    except (IOError, OSError):
+        return None
+    head, _, tail = stat.rpartition(')')
+    comm = head.partition('(')[2]
+    fields = tail.split()
+    cpu = sum(int(f) for f in fields[11:15]) / float(ClockTicks)
+    return int(fields[1]), comm, cpu, int(fields[21]) * PageSize
+
+
+def read_io(pid):
+    try:
+        with open('/proc/{}/io'.format(pid)) as fp:
+            values = dict(line.split(': ') for line in fp.read().splitlines())
+    except (IOError, OSError, ValueError):
+        return 0, 0
+    return int(values.get('read_bytes', 0)), int(values.get('write_bytes', 0))
+
+
+def descendants(root):
+    """Return {pid: stat} for every live process below |root|."""
+    stats = {}
+    for name in os.listdir('/proc'):
+        if name.isdigit():
+            stat = read_stat(int(name))
+            if stat is not None:
+                stats[int(name)] = stat
+
+    children = {}
+    for pid, stat in stats.items():
+        children.setdefault(stat[0], []).append(pid)
+
+    found = {}
+    pending = list(children.get(root, []))
+    while pending:
+        pid = pending.pop()
+        found[pid] = stats[pid]
+        pending += children.get(pid, [])
+    return found
+
+
+def children_cpu():
+    times = os.times()
+    return times[2] + times[3]
+
+
+class Sampler(threading.Thread):
+    def __init__(self, interval=1.0):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.interval = interval
+        self.samples = []
+        self.io = {}
+        self.stopping = threading.Event()
+        self.have_proc = os.path.isdir('/proc')
+
+    def start(self):
+        self.start_time = time.time()
+        self.start_cpu = children_cpu()
+        threading.Thread.start(self)
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+        self.wall = time.time() - self.start_time
+        self.cpu = children_cpu() - self.start_cpu
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            if self.have_proc:
+                self.sample()
+
+    def sample(self):
+        procs = descendants(os.getpid())
+
+        # Processes that have exited were reaped by us, so their CPU time is in
+        # our children's time. I/O is different: a process's I/O includes that
+        # of the children it has reaped. So count our own children, remembering
+        # them once they are gone, plus whatever is still running below them.
+        cpu = children_cpu() - self.start_cpu + sum(stat[2] for stat in procs.values())
+        rss = sum(stat[3] for stat in procs.values())
+        running = [0, 0]
+        for pid, stat in procs.items():
+            if stat[0] == os.getpid():
+                self.io[pid] = read_io(pid)
+            else:
+                io = read_io(pid)
+                running[0] += io[0]
+                running[1] += io[1]
+        read = sum(io[0] for io in self.io.values()) + running[0]
+        written = sum(io[1] for io in self.io.values()) + running[1]
+        self.samples.append([round(time.time() - self.start_time, 2), round(cpu, 2),
+                             rss, read, written, len(procs)])
+
+    def summary(self):
+        last = self.samples[-1] if self.samples else [0, 0, 0, 0, 0, 0]
+        return {
+            'wall': round(self.wall, 2),
+            'cpu': round(self.cpu, 2),
+            'parallelism': round(self.cpu / self.wall, 2) if self.wall else 0.0,
+            'peak_rss': max([s[2] for s in self.samples] or [0]),
+            'read_bytes': last[3],
+            'write_bytes': last[4],
+        }
+
+    def save(self, path):
+        summary = self.summary()
+        with open(path, 'w') as fp:
+            json.dump({'summary': summary, 'columns': Columns, 'samples': self.samples},
+                      fp, separators=(',', ':'))
+        return summary
+
+
+def backtraces(pids):
+    """Return gdb backtraces of all threads of every process in |pids|."""
+    traces = []
+    for pid in pids:
+        stat = read_stat(pid)
+        comm = stat[1] if stat else '?'
+        try:
+            trace = subprocess.check_output(['gdb', '-batch', '-p', str(pid),
+                                             '-ex', 'thread apply all bt'],
+                                            stderr=subprocess.STDOUT, timeout=120)
+            trace = trace.decode('UTF-8', 'replace')
+        except (OSError, subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            trace = "No backtrace: {}\n".format(e)
+        traces.append("==== {} ({}) ====\n{}".format(pid, comm, trace))
+    return '\n'.join(traces)
+
+
+class Watchdog:
+    """
+    Kill |proc| and all of its descendants if it is still running after
+    |timeout| seconds, writing their backtraces to |report| first.
+    """
+    def __init__(self, proc, timeout, report):
+        self.proc = proc
+        self.timeout = timeout
+        self.report = report
+        self.expired = False
+        self.timer = threading.Timer(timeout, self.expire)
+        self.timer.daemon = True
+
+    def start(self):
+        self.timer.start()
+
+    def cancel(self):
+        self.timer.cancel()
+
+    def expire(self):
+        if self.proc.poll() is not None:
+            return
+        self.expired = True
+        if not os.path.isdir('/proc'):
+            self.proc.kill()
+            return
+
+        # Collect the whole tree before killing anything, so that nothing gets
+        # reparented out of our sight.
+        pids = [self.proc.pid] + sorted(descendants(self.proc.pid))
+        with open(self.report, 'w') as fp:
+            fp.write(backtraces(pids))
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
@@ -6,12 +6,26 @@ Configure or build in the directory specified.
 """
 
 import argparse
+import concurrent.futures
+import contextlib
+import hashlib
+import json
 import os.path
 import platform
+import shutil
 import subprocess
 import sys
-
+import tempfile
+import threading
+import time
+
+import affected
+import cache
+import ccprof
+import clobber
+import compare
 import lib
+import procmon
 
 
 class ParseError(Exception):
@@ -19,14 +33,53 @@ class ParseError(Exception):
         Exception.__init__(self, msg)
         self.context = context
 
+def find_program(name):
+    try:
+        return subprocess.check_output(['which', name]).decode('UTF-8').strip()
+    except FileNotFoundError:
+        # This is windows, where we're not using the path.
+        return ''
+    except subprocess.CalledProcessError:
+        return ''
+
 # Find ccache.
-try:
-    CCachePath = subprocess.check_output(['which', 'ccache']).decode('UTF-8').strip()
-except FileNotFoundError:
-    # This is windows, where we're not using the path.
-    CCachePath = ''
-except subprocess.CalledProcessError:
-    CCachePath = ''
+CCachePath = find_program('ccache')
+
+def linker_dir():
+    """
+    Return a directory of the linker names, all linked to the ccprof linker
+    wrapper, for the compiler to find on $COMPILER_PATH.
+    """
+    path = os.path.join(lib.StateDir, 'linkers')
+    if not os.path.isdir(path):
+        os.makedirs(path, exist_ok=True)
+    for name in ccprof.LinkerNames:
+        link = os.path.join(path, name)
+        if os.path.realpath(link) != ccprof.WrapperPath:
+            if os.path.lexists(link):
+                os.unlink(link)
+            try:
+                os.symlink(ccprof.WrapperPath, link)
+            except FileExistsError:
+                pass # Another wfm got there first.
+    return path
+
+LinkProbes = {}
+def supports_link_flags(compiler, flags):
+    """Check whether |compiler| can link a program when passed |flags|."""
+    if not compiler:
+        return False
+    key = (compiler, tuple(flags))
+    if key not in LinkProbes:
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                subprocess.run(compiler.split() + flags + ['-x', 'c++', '-', '-o', os.path.join(tmp, 'a.out')],
+                               input=b'int main() { return 0; }\n', check=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                LinkProbes[key] = True
+            except (OSError, subprocess.CalledProcessError):
+                LinkProbes[key] = False
+    return LinkProbes[key]
 
 class ConfigParser:
     MultiCharShortcuts = {
@@ -54,10 +107,20 @@ class ConfigParser:
         'noext': ".noicu.noctypes",
         # Compiler wrappers.
         'distcc': "'--with-compiler-wrapper=distcc;",
+        'ccprof': "'--with-compiler-wrapper=" + ccprof.WrapperPath + ";",
     }
     if CCachePath:
         MultiCharShortcuts['ccache'] = '^CCACHE_CPP2=1;^CCACHE_UNIFY=1;\'--with-ccache=' + CCachePath + ';'
 
+    # Fast linking: split DWARF keeps debug info out of the link, and a gdb
+    # index, which only gold and lld can build, saves gdb from making its own.
+    MultiCharShortcuts['splitdwarf'] = '^CFLAGS=-gsplit-dwarf;^CXXFLAGS=-gsplit-dwarf;'
+
+    # Whether the context's compiler can use these depends on the compiler, so
+    # they are expanded by linker_flags once the compiler has been parsed.
+    LinkerShortcuts = ('lld', 'gold', 'gdbindex', 'fastlink')
+    Linkers = ('lld', 'gold') # Fastest first.
+
     Compilers = {
         'c': {
                 'name': 'Clang',
@@ -99,6 +162,7 @@ class ConfigParser:
         'D': '+optimize+debug',
         'T': "!debug'--enable-optimize=-O2 -gline-tables-only;",
         't': "!debug'--enable-optimize=-O2 -g;",
+        'f': '!optimize+debug.fastlink',
     }
 
     FlagChars = set(('^', '+', '=', '!', '?', '\'', '.', '@')) # '*' is available
@@ -108,6 +172,7 @@ class ConfigParser:
         assert '/' not in target
         assert '\\' not in target
         self.have_parsed = False
+        self.error = None
         self.environment = {}
         self.arguments = []
 
@@ -138,11 +203,36 @@ class ConfigParser:
     def parse_multichars(self, t):
         assert t[0] == '.'
         name, t = self.consume_to_next_flag(t)
+        if name in self.LinkerShortcuts:
+            self.parse_flags(self.linker_flags(name))
+            return t
         if name not in self.MultiCharShortcuts:
             raise ParseError('Unrecognized multi char shortcut: "%s"' % name, name + t)
         self.parse_flags(self.MultiCharShortcuts[name])
         return t
 
+    def linker_flags(self, name):
+        """Expand a fast link shortcut for the linkers our C++ compiler accepts."""
+        compiler = self.environment.get('CXX', '')
+        if name in self.Linkers:
+            if not supports_link_flags(compiler, ['-fuse-ld=' + name]):
+                raise ParseError('%s cannot link with %s' % (compiler or 'The compiler', name), name)
+            return '^LDFLAGS=-fuse-ld=%s;' % name
+
+        # A gdb index needs gold or lld: keep the one the context already
+        # picked, else take the fastest that works.
+        ldflags = self.environment.get('LDFLAGS', '').split()
+        linkers = [l for l in self.Linkers if '-fuse-ld=' + l in ldflags] or self.Linkers
+        for linker in linkers:
+            if supports_link_flags(compiler, ['-fuse-ld=' + linker, '-Wl,--gdb-index']):
+                flags = '^LDFLAGS=-Wl,--gdb-index;'
+                if '-fuse-ld=' + linker not in ldflags:
+                    flags = '^LDFLAGS=-fuse-ld=%s;' % linker + flags
+                return flags + '.splitdwarf' if name == 'fastlink' else flags
+        if name == 'gdbindex':
+            raise ParseError('%s has no linker that can build a gdb index' % (compiler or 'The compiler'), name)
+        return '.splitdwarf'
+
     def parse_enable(self, t):
         assert t[0] == '+'
         arg, t = self.consume_to_next_flag(t)
@@ -211,7 +301,7 @@ class ConfigParser:
 
     def parse_toplevel(self, t):
         if t[0] != '_':
-            raise ParseError('String must start with \'_\'.')
+            raise ParseError('String must start with \'_\'.', t)
         t = t[1:]
         if len(t) < 3:
             raise ParseError('String requires at least a compiler, optimization, and arch flag.', t)
@@ -224,18 +314,44 @@ class ConfigParser:
 
     def parse(self):
         if self.have_parsed:
+            if self.error:
+                raise self.error
             return
         try:
             self.parse_toplevel(self.target)
         except ParseError as e:
             print(str(e))
             if e.context in self.target:
-                pos = len(t) - len(e.context)
+                pos = self.target.find(e.context)
                 print("Context: %s" % self.target)
                 print("         %s^" % ('-' * pos))
+            self.error = e
+            raise
         finally:
             self.have_parsed = True
 
+    def normalized(self):
+        """
+        Return the configuration in a canonical form: the last of conflicting
+        enable/disable or with/without arguments wins and order is irrelevant.
+        """
+        self.parse()
+        features = {}
+        literals = set()
+        for arg in self.arguments:
+            for prefix, kind in (('--enable-', 'enable'), ('--disable-', 'enable'),
+                                 ('--without-', 'with'), ('--with-', 'with')):
+                if arg.startswith(prefix):
+                    name = arg[len(prefix):].partition('=')[0]
+                    features[(kind, name)] = arg
+                    break
+            else:
+                literals.add(arg)
+        return {
+            'environment': dict(self.environment),
+            'arguments': sorted(features.values()) + sorted(literals),
+        }
+
     def show(self):
         self.parse()
         print("Environment:")
@@ -283,18 +399,340 @@ def autoconf():
         subprocess.call([sh, 'autoconf-2.13'])
 
 
+# Default limits for a single test and for a whole test suite, in seconds.
+DefaultTestTimeout = 300
+DefaultSuiteTimeout = 3 * 60 * 60
+
+# Once we know how long something takes, allow this many times as long, but no
+# less than MinTimeout.
+TimeoutFactor = 5
+MinTimeout = 60
+
+TIMEOUT = 'TIMEOUT'
+
+# The default place for RAM-backed objdirs, and where their final artifacts are
+# kept on disk.
+DefaultRamDir = '/dev/shm/wfm'
+PersistDir = os.path.join(lib.StateDir, 'persist')
+
+
 class Builder:
-    def __init__(self, builddir):
+    # Paths, relative to the context, that make up a finished build.
+    artifact_paths = ()
+
+    def __init__(self, builddir, test_timeout=DefaultTestTimeout, suite_timeout=DefaultSuiteTimeout):
         self.builddir = builddir.strip().strip(os.path.sep).strip('/')
+        self.resources = []
+        self.build_start = None
+        self.test_timeout = test_timeout
+        self.suite_timeout = suite_timeout
+        self.timed_out = []
+        self.runtimes = None
+        self.runtimes_lock = threading.Lock()
+
+    def state_path(self, *parts):
+        """Return a path in the directory where wfm keeps its per-context state."""
+        path = os.path.join(self.builddir, '.wfm', *parts)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        return path
+
+    @contextlib.contextmanager
+    def monitor(self, phase):
+        """Sample the processes started while running |phase|."""
+        sampler = procmon.Sampler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            summary = sampler.save(self.state_path('resources', phase + '.json'))
+            self.resources.append((phase, summary))
+
+    def show_resources(self):
+        self.banner("Resources: " + self.builddir)
+        print("{:14} | {:>9} | {:>9} | {:>6} | {:>10} | {:>10}".format(
+              'phase', 'wall', 'peak rss', 'cores', 'read', 'written'))
+        for phase, summary in self.resources:
+            print("{:14} | {:>8.1f}s | {:>9} | {:>6.2f} | {:>10} | {:>10}".format(
+                  phase, summary['wall'], lib.format_bytes(summary['peak_rss']),
+                  summary['parallelism'], lib.format_bytes(summary['read_bytes']),
+                  lib.format_bytes(summary['write_bytes'])))
+
+        # Link times come from the .ccprof or linker wrapper, which see each
+        # link start and finish exactly.
+        if self.build_start is None:
+            return
+        links = ccprof.links_since(self.builddir, self.build_start)
+        if links:
+            print("{} links, {:.1f}s total:".format(len(links), sum(seconds for _, seconds in links)))
+            for target, seconds in sorted(links, key=lambda link: link[1], reverse=True):
+                print("{:>8.1f}s  {}".format(seconds, target))
+
+    def timeout_for(self, key, limit):
+        """Return the timeout for |key|, tightened by its recorded runtime."""
+        with self.runtimes_lock:
+            if self.runtimes is None:
+                path = os.path.join(self.builddir, '.wfm', 'runtimes.json')
+                self.runtimes = {}
+                if os.path.exists(path):
+                    with open(path) as fp:
+                        self.runtimes = json.load(fp)
+            previous = self.runtimes.get(key)
+        if previous is None:
+            return limit
+        return min(limit, max(MinTimeout, TimeoutFactor * previous))
+
+    @contextlib.contextmanager
+    def watch(self, key, proc, limit, track=True):
+        """
+        Kill |proc| and everything it started if it runs past the timeout for
+        |key|, saving backtraces of all its threads first. Yields the watchdog;
+        once it expired, |key| is recorded as timed out. Without |track|, e.g.
+        for a filtered suite, the runtime says nothing about the next run, so
+        it is neither used nor recorded.
+        """
+        timeout = self.timeout_for(key, limit) if track else limit
+        report = self.state_path('timeouts', key.replace('/', '.') + '.txt')
+        dog = procmon.Watchdog(proc, timeout, report)
+        start = time.time()
+        dog.start()
+        try:
+            yield dog
+        finally:
+            dog.cancel()
+            elapsed = time.time() - start
+            with self.runtimes_lock:
+                if dog.expired:
+                    self.timed_out.append(key)
+                    print("TEST-UNEXPECTED-TIMEOUT | {} | after {:.0f}s, backtraces in {}".format(
+                          key, elapsed, report))
+                elif track:
+                    self.runtimes[key] = round(elapsed, 2)
+                    with open(self.state_path('runtimes.json'), 'w') as fp:
+                        json.dump(self.runtimes, fp, indent=1, sort_keys=True)
+
+    def watched_call(self, key, command, limit, capture=False, track=True, **kwargs):
+        """
+        Run |command| under a watchdog. Returns (status, output), where status is
+        the return code or TIMEOUT and output is only captured on request.
+        """
+        if capture:
+            kwargs.update(stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        proc = subprocess.Popen(command, **kwargs)
+        with self.watch(key, proc, limit, track) as dog:
+            output, _ = proc.communicate()
+        if capture:
+            output = output.decode('UTF-8', 'replace')
+        return (TIMEOUT if dog.expired else proc.returncode), output
+
+    def stored_config(self):
+        """Return the normalized configuration the context was last set up with."""
+        path = os.path.join(self.builddir, '.wfm', 'config.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as fp:
+            return json.load(fp)
+
+    def store_config(self, config):
+        with open(self.state_path('config.json'), 'w') as fp:
+            json.dump(config, fp, indent=1, sort_keys=True)
+
+    def clobber_for(self, config):
+        """
+        Delete the parts of the context that are invalidated by changing from
+        the stored configuration to |config|.
+        """
+        old = self.stored_config()
+        if old is None or old == config or not os.path.isdir(self.builddir):
+            return
+        paths = clobber.invalidated(old, config)
+        if paths is clobber.Everything:
+            print("Configuration changed, clobbering: {}".format(self.builddir))
+        elif paths:
+            print("Configuration changed, clobbering: {}".format(
+                  ' '.join(os.path.join(self.builddir, path) for path in paths)))
+        clobber.clobber(self.builddir, paths)
+
+    def tree_id(self):
+        """Tell apart the contexts of the same name in different source trees."""
+        return hashlib.sha1(os.path.realpath(os.getcwd()).encode('UTF-8')).hexdigest()[:12]
+
+    def ram_path(self, root):
+        """Where the objdir lives under |root|; one directory per source tree."""
+        return os.path.join(root, self.tree_id(), self.builddir)
+
+    def persist_path(self):
+        return os.path.join(PersistDir, self.tree_id(), self.builddir)
+
+    def persisted_paths(self):
+        return self.artifact_paths + ('config.status',
+                                      os.path.join('.wfm', 'fingerprint'),
+                                      os.path.join('.wfm', 'config.json'))
+
+    def in_ram(self):
+        return os.path.islink(self.builddir)
+
+    def setup_ramdir(self, root, budget_gb):
+        """
+        Put the objdir under |root|, normally a tmpfs, with a symlink at the
+        usual place. A context stays in RAM once it is there, so later runs
+        only have to rehydrate it after a reboot or when it grew too large.
+        """
+        if not self.in_ram():
+            if root is None:
+                return
+            if os.path.isdir(self.builddir):
+                print("{} is already on disk; remove it to move it to RAM.".format(self.builddir))
+                return
+            target = self.ram_path(root)
+            if os.path.isdir(target):
+                shutil.rmtree(target)
+            os.makedirs(target)
+            os.symlink(target, self.builddir)
+            self.rehydrate()
+            return
+
+        target = os.readlink(self.builddir)
+        if not os.path.isdir(target):
+            print("{} is gone from RAM, rehydrating.".format(target))
+        elif budget_gb and cache.tree_size(target) > budget_gb * 1024 ** 3:
+            print("{} is larger than {}GB, rehydrating.".format(target, budget_gb))
+            shutil.rmtree(target)
+        else:
+            return
+        os.makedirs(target)
+        self.rehydrate()
+
+    def rehydrate(self):
+        """Seed an empty objdir with the artifacts synced back by the last build."""
+        persist = self.persist_path()
+        for path in self.persisted_paths():
+            if os.path.exists(os.path.join(persist, path)):
+                cache.copy_path(os.path.join(persist, path), os.path.join(self.builddir, path))
+
+        # config.status recreates the objdir skeleton without rerunning
+        # configure; if it cannot, configure has to run after all.
+        confstatus = os.path.join(self.builddir, 'config.status')
+        if os.path.exists(confstatus):
+            if subprocess.call([os.path.realpath(confstatus)], cwd=self.builddir) != 0:
+                os.unlink(confstatus)
+
+    def sync_back(self):
+        """Copy the final artifacts of a RAM objdir to persistent storage."""
+        persist = self.persist_path()
+        for path in self.persisted_paths():
+            if os.path.exists(os.path.join(self.builddir, path)):
+                cache.copy_path(os.path.join(self.builddir, path), os.path.join(persist, path))
+            elif os.path.lexists(os.path.join(persist, path)):
+                clobber.clobber(persist, [path])
+
+    def nearest_context(self, config):
+        """
+        Return the sibling context whose configuration is closest to |config|,
+        or None if every one of them would have to be rebuilt from scratch.
+        """
+        best, best_score = None, None
+        for name in os.listdir('.'):
+            if name == self.builddir or not name.startswith('_'):
+                continue
+            other = Builder(name).stored_config()
+            if other is None or not os.path.exists(os.path.join(name, 'config.status')):
+                continue
+            paths = clobber.invalidated(other, config)
+            if paths is clobber.Everything:
+                continue
+            distance = len(set(other['arguments']) ^ set(config['arguments']))
+            score = (len(paths), distance)
+            if best_score is None or score < best_score:
+                best, best_score = name, score
+        return best
+
+    def clone_nearest(self):
+        """
+        Seed a new context with a copy of the closest existing one, so that the
+        build only redoes what the difference in configuration invalidates.
+        """
+        if self.stored_config() is not None or os.path.exists(os.path.join(self.builddir, 'config.status')):
+            return
+        config = ConfigParser(self.builddir).normalized()
+        source = self.nearest_context(config)
+        if source is None:
+            return
+
+        self.banner("Cloning {} into {}".format(source, self.builddir))
+        src, dst = os.path.realpath(source), os.path.realpath(self.builddir)
+        cache.clone_tree(src, dst)
+
+        # Keep only the configuration the objdir was built with; configure then
+        # clobbers what the difference invalidates. The dependency files name
+        # headers by absolute path and dist/ installs by absolute symlink, both
+        # of which have to point into the clone.
+        os.unlink(os.path.join(dst, 'config.status'))
+        for name in os.listdir(os.path.join(dst, '.wfm')):
+            if name != 'config.json':
+                clobber.clobber(os.path.join(dst, '.wfm'), [name])
+        for dirpath, dirnames, filenames in os.walk(dst):
+            for name in dirnames + filenames:
+                path = os.path.join(dirpath, name)
+                if not os.path.islink(path):
+                    continue
+                target = os.readlink(path)
+                if target == src or target.startswith(src + os.path.sep):
+                    os.unlink(path)
+                    os.symlink(dst + target[len(src):], path)
+            if os.path.basename(dirpath) != '.deps':
+                continue
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                with open(path, errors='surrogateescape') as fp:
+                    content = fp.read()
+                if src in content:
+                    with open(path, 'w', errors='surrogateescape') as fp:
+                        fp.write(content.replace(src + os.path.sep, dst + os.path.sep))
+
+    def fingerprint(self):
+        """
+        Return the key of the revision and configuration this context builds, or
+        None if the source tree has local changes.
+        """
+        revision = lib.source_revision()
+        if revision is None:
+            return None
+        return cache.ArtifactCache.key(revision, ConfigParser(self.builddir).normalized())
+
+    def built_fingerprint(self):
+        """Return the fingerprint and origin of the current contents of the context."""
+        path = os.path.join(self.builddir, '.wfm', 'fingerprint')
+        if not os.path.exists(path):
+            return None, None
+        with open(path) as fp:
+            built = json.load(fp)
+        return built['key'], built['restored']
+
+    def mark_built(self, fingerprint, restored):
+        with open(self.state_path('fingerprint'), 'w') as fp:
+            json.dump({'key': fingerprint, 'restored': restored}, fp)
+
+    def clear_built(self):
+        """Forget the fingerprint, e.g. after building from a modified tree."""
+        path = os.path.join(self.builddir, '.wfm', 'fingerprint')
+        if os.path.exists(path):
+            os.unlink(path)
 
     def banner(self, content):
-        print("+-------------------------------------------------------------------------------")
-        print("+-- {} {}+".format(content, '-' * (80 - 5 - len(content))))
-        print("+-------------------------------------------------------------------------------")
+        # One write, so that banners from configures running in the background
+        # do not interleave with others.
+        print("+-------------------------------------------------------------------------------\n"
+              "+-- {} {}+\n"
+              "+-------------------------------------------------------------------------------".format(
+              content, '-' * (80 - 5 - len(content))))
         sys.stdout.flush()
 
 
 class SpiderMonkeyBuilder(Builder):
+    artifact_paths = (os.path.join('dist', 'bin'), os.path.join('js', 'src', 'js'))
+
     def needs_configure(self):
         confstatus = os.path.join(self.builddir, 'config.status')
 
@@ -306,13 +744,20 @@ class SpiderMonkeyBuilder(Builder):
             print("config.status is older than configure")
             return True
 
+        stored = self.stored_config()
+        if stored is not None and stored != ConfigParser(self.builddir).normalized():
+            print("configuration changed")
+            return True
+
         return False
 
-    def configure(self):
+    def configure(self, log=None):
+        """Run configure, writing its output to the file |log| if given."""
         self.banner("Configuring: " + self.builddir)
 
         cfg = ConfigParser(self.builddir)
         cfg.parse()
+        self.clobber_for(cfg.normalized())
 
         # Make the directory if it doesn't exist.
         pwd = os.getcwd()
@@ -335,8 +780,14 @@ class SpiderMonkeyBuilder(Builder):
             # Also, a ton more stuff is needed, so just dump the env filtering.
             env = os.environ
 
-        subprocess.check_call(configure + cfg.arguments, env=env, cwd=confdir,
-                              shell=shell)
+        if log is None:
+            subprocess.check_call(configure + cfg.arguments, env=env, cwd=confdir,
+                                  shell=shell)
+        else:
+            with open(log, 'w') as fp:
+                subprocess.check_call(configure + cfg.arguments, env=env, cwd=confdir,
+                                      shell=shell, stdout=fp, stderr=subprocess.STDOUT)
+        self.store_config(cfg.normalized())
 
     def which_make(self):
         if platform.system() == 'Windows':
@@ -362,32 +813,149 @@ class SpiderMonkeyBuilder(Builder):
         env = {k: os.environ[k] for k in inherited if k in os.environ}
         env = os.environ.copy()
 
+        # Tell the .ccprof compiler wrapper where to record.
+        cfg = ConfigParser(self.builddir)
+        cfg.parse()
+        if ccprof.WrapperPath in ' '.join(cfg.arguments):
+            env['WFM_CCPROF_LOG'] = os.path.realpath(self.state_path(ccprof.LogName))
+            compiler = cfg.environment.get('CXX', 'c++').split()[0]
+            if ccprof.supports_time_trace(compiler):
+                env['WFM_CCPROF_TIMETRACE'] = '1'
+        elif platform.system() != 'Windows':
+            # Otherwise time the links with the linker wrapper, which the
+            # compiler finds before the real linker.
+            env['WFM_LINK_LOG'] = os.path.realpath(self.state_path(ccprof.LinkLogName))
+            env['COMPILER_PATH'] = os.pathsep.join(
+                [linker_dir()] + [p for p in [env.get('COMPILER_PATH')] if p])
+
+        self.build_start = time.time()
         subprocess.check_call([self.which_make()] + extra, cwd=self.builddir, env=env)
 
     def check_style(self):
         self.banner("check-style: " + self.builddir)
         subprocess.check_call([self.which_make(), 'check-style'], cwd=self.builddir)
 
-    def jsapi_tests(self, debugger: bool, filter: str):
+    def list_jsapi_tests(self, path):
+        """
+        Ask the jsapi-tests binary for the names of all tests it contains. Older
+        binaries do not know --list; for those we get back nothing.
+        """
+        try:
+            output = subprocess.check_output([path, '--list'], stderr=subprocess.DEVNULL)
+        except subprocess.CalledProcessError:
+            return []
+        names = [line.strip() for line in output.decode('UTF-8').splitlines()]
+        return [name for name in names if name and ' ' not in name]
+
+    def jsapi_tests(self, debugger: bool, filter: str, n_jobs: int):
         self.banner("jsapi-tests: " + self.builddir)
         path = os.path.join(self.builddir, 'dist', 'bin', 'jsapi-tests')
-        args = [path, filter] if not debugger else ['gdb', '--args', path, filter]
-        subprocess.check_call(args)
 
-    def jit_tests(self, filter: str):
+        # Without a test list we can only run the whole binary as one process.
+        names = [name for name in self.list_jsapi_tests(path) if filter in name]
+        if not names:
+            if debugger:
+                subprocess.check_call(['gdb', '--args', path, filter])
+                return
+            status, _ = self.watched_call('jsapi-tests', [path, filter], self.suite_timeout,
+                                          track=not filter)
+            if status not in (0, TIMEOUT):
+                raise subprocess.CalledProcessError(status, [path, filter])
+            return
+
+        if debugger:
+            if filter in names:
+                names = [filter]
+            if len(names) != 1:
+                raise Exception("Debugging needs exactly one test, filter matches {}: {}".format(
+                                len(names), ' '.join(names)))
+            subprocess.check_call(['gdb', '--args', path, names[0]])
+            return
+
+        # Run each test in its own process so that a crash is attributed to the
+        # test that caused it and does not take down the rest of the suite.
+        def run(name):
+            return self.watched_call('jsapi-tests/' + name, [path, name], self.test_timeout,
+                                     capture=True)
+        results = lib.parallel_map(run, names, n_jobs)
+        failures = []
+        timeouts = []
+        for name, (returncode, output) in zip(names, results):
+            if returncode == 0:
+                continue
+            if returncode == TIMEOUT:
+                timeouts.append(name)
+                continue
+            if returncode < 0:
+                status = "CRASH (signal {})".format(-returncode)
+            else:
+                status = "FAIL (exit {})".format(returncode)
+            failures.append((name, status))
+            print("TEST-UNEXPECTED-FAIL | {} | {}".format(name, status))
+            print(output.rstrip())
+
+        print("jsapi-tests: {} passed, {} failed, {} timed out".format(
+              len(names) - len(failures) - len(timeouts), len(failures), len(timeouts)))
+        for name, status in failures:
+            print("\t{}: {}".format(name, status))
+        if failures:
+            raise Exception("jsapi-tests failed in {}".format(self.builddir))
+
+    def jit_tests(self, filter: str, only_affected: bool):
         self.banner("jit-tests: " + self.builddir)
         testsuite = os.path.join('jit-test', 'jit_test.py')
         binary = os.path.join(self.builddir, 'js', 'src', 'js')
         if platform.system() == 'Windows':
             binary += '.exe'
-        command = [testsuite, binary, '--tbpl', filter]
-        subprocess.check_call(command, shell=True, env=os.environ)
+        command = [testsuite, binary, '--tbpl', '--timeout={}'.format(self.test_timeout)]
+
+        # An explicit filter always wins over the change-based selection.
+        changed = None
+        selected = None
+        if only_affected and not filter:
+            changed = affected.try_changed_files()
+            if changed is None:
+                print("Running the full suite.")
+            else:
+                selected = affected.select(changed, affected.load_history())
+        if selected is not None:
+            print("Running affected jit-tests: {}".format(' '.join(selected) or '(none)'))
+            if not selected:
+                return
+            # jit_test.py selects tests whose path contains an argument, so
+            # anchor each directory to keep 'gc' from matching 'basic/gc-*.js'.
+            command += [os.path.join(d, '') for d in selected]
+        elif filter:
+            command += [filter]
+
+        # Echo the output as it arrives, but keep the failures so that we can
+        # learn which tests cover the files being changed.
+        failed = []
+        proc = subprocess.Popen(command, shell=platform.system() == 'Windows', env=os.environ,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        with self.watch('jit-tests', proc, self.suite_timeout,
+                        track=not filter and selected is None) as dog:
+            for line in proc.stdout:
+                line = line.decode('UTF-8', 'replace')
+                print(line, end='')
+                if line.startswith('TEST-UNEXPECTED-FAIL'):
+                    failed.append(line.split('|')[1].strip())
+            proc.wait()
+        if failed and changed is None:
+            changed = affected.try_changed_files()
+        if failed and changed is not None:
+            affected.record_failures(changed, failed)
+        if proc.returncode and not dog.expired:
+            raise subprocess.CalledProcessError(proc.returncode, command)
 
     def js_tests(self):
         self.banner("js-tests: " + self.builddir)
         testsuite = os.path.join('tests', 'jstests.py')
         binary = os.path.join(self.builddir, 'dist', 'bin', 'js')
-        subprocess.check_call([testsuite, binary, '--tbpl'])
+        command = [testsuite, binary, '--tbpl', '--timeout={}'.format(self.test_timeout)]
+        status, _ = self.watched_call('js-tests', command, self.suite_timeout)
+        if status not in (0, TIMEOUT):
+            raise subprocess.CalledProcessError(status, command)
 
     def mfbt_tests(self, filter: str):
         self.banner("mfbt-tests: " + self.builddir)
@@ -398,7 +966,9 @@ class SpiderMonkeyBuilder(Builder):
                     continue
                 print("Running: {}".format(filename))
                 binary = os.path.join(bindir, filename)
-                subprocess.check_call([binary])
+                status, _ = self.watched_call('mfbt-tests/' + filename, [binary], self.test_timeout)
+                if status not in (0, TIMEOUT):
+                    raise subprocess.CalledProcessError(status, [binary])
 
 
 class MozConfigBuilder(Builder):
@@ -413,6 +983,10 @@ class MozConfigBuilder(Builder):
         cfg = ConfigParser(self.builddir)
         cfg.parse()
 
+        # Mach only clobbers everything, and only when CLOBBER changes, so
+        # remove whatever the configuration change invalidates ourselves.
+        self.clobber_for(cfg.normalized())
+
         # Make the directory if it doesn't exist.
         pwd = os.getcwd()
         confdir = os.path.realpath(os.path.join(pwd, self.builddir))
@@ -428,6 +1002,303 @@ class MozConfigBuilder(Builder):
             mozconfig.write("mk_add_options AUTOCLOBBER=1\n");
             mozconfig.write("mk_add_options MOZ_MAKE_FLAGS=\"-j{}\"\n".format(lib.get_jobcount(n_jobs)));
             mozconfig.write("mk_add_options MOZ_OBJDIR=@TOPSRCDIR@/{}\n".format(self.builddir))
+        self.store_config(cfg.normalized())
+
+
+def prepare_context(builder, args, artifacts, quiet=False):
+    """
+    Restore the context from the artifact cache if we can, and configure it
+    otherwise. Returns the fingerprint of the build if it still needs one, or
+    False if it is already up to date. With |quiet|, configure output goes to a
+    log, which is shown only if configure fails.
+    """
+    fingerprint = None
+    if artifacts and builder.artifact_paths:
+        fingerprint = builder.fingerprint()
+
+    if fingerprint:
+        # A restored context has no objects to make incrementally, so leave it
+        # alone for as long as the revision and configuration stay the same.
+        if builder.built_fingerprint() == (fingerprint, True):
+            builder.banner("Up to date from cache: " + builder.builddir)
+            return False
+        if builder.built_fingerprint()[0] != fingerprint and artifacts.restore(fingerprint, builder.builddir):
+            builder.banner("Restored from cache: " + builder.builddir)
+            builder.mark_built(fingerprint, restored=True)
+            return False
+
+    # Configure if needed.
+    if builder.needs_configure():
+        log = builder.state_path('configure.log') if quiet else None
+        try:
+            with builder.monitor('configure'):
+                builder.configure(log)
+        except Exception:
+            builder.banner("Configure FAILED: " + builder.builddir)
+            if log and os.path.exists(log):
+                with open(log, errors='replace') as fp:
+                    print(''.join(fp.readlines()[-30:]), end='')
+                print("Full log: {}".format(log))
+            sys.stdout.flush()
+            raise
+    return fingerprint
+
+
+def build_context(builder, args, extra, artifacts, fingerprint):
+    """Build a prepared context and record the result."""
+    with builder.monitor('build'):
+        builder.build(args.verbose, args.jobs, extra)
+
+    if fingerprint:
+        artifacts.store(fingerprint, builder.builddir, builder.artifact_paths)
+        builder.mark_built(fingerprint, restored=False)
+    else:
+        builder.clear_built()
+
+    if builder.in_ram():
+        builder.sync_back()
+
+
+def update_context(builder, args, extra, artifacts):
+    """Bring the context up to date, from the artifact cache if we can."""
+    fingerprint = prepare_context(builder, args, artifacts)
+    if fingerprint is not False:
+        build_context(builder, args, extra, artifacts, fingerprint)
+
+
+def strip_args(argv, options, positionals):
+    """
+    Remove |options|, which all take a value, and the |positionals| from the
+    command line |argv|.
+    """
+    out = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+            continue
+        if arg in positionals:
+            continue
+        name = arg.partition('=')[0]
+        if name in options:
+            skip = '=' not in arg
+            continue
+        if any(arg.startswith(opt) and len(opt) == 2 and len(arg) > 2 for opt in options):
+            continue
+        out.append(arg)
+    return out
+
+
+def build_trees(args):
+    """
+    Run wfm for every context in the same subdirectory of each of the selected
+    trees in the branch directory, all trees at once, splitting the cores.
+    """
+    branchdir = os.path.expanduser(args.branch_dir)
+    trees = sorted(os.listdir(branchdir))
+    if args.trees != 'all':
+        wanted = [tree for tree in args.trees.split(',') if tree]
+        missing = [tree for tree in wanted if tree not in trees]
+        if missing:
+            print("No such trees in {}: {}".format(branchdir, ', '.join(missing)))
+            return 1
+        trees = wanted
+    if not trees:
+        print("No trees to build in {}.".format(branchdir))
+        return 1
+
+    subdir = os.path.relpath(os.getcwd(), hg('root'))
+    jobs = max(1, lib.get_jobcount(args.jobs) // len(trees))
+    passthrough = strip_args(sys.argv[1:], ('--trees', '--branch-dir', '--jobs', '-j'),
+                             args.builddirs)
+    logdir = os.path.join(lib.StateDir, 'trees')
+
+    def build_tree(tree):
+        results = []
+        cwd = os.path.join(branchdir, tree, subdir)
+        for builddir in args.builddirs:
+            log = os.path.join(logdir, tree, builddir + '.log')
+            if not os.path.isdir(os.path.dirname(log)):
+                os.makedirs(os.path.dirname(log))
+            # The job count goes last: argparse keeps the last -j, so this also
+            # wins over one hidden in combined short flags, like -vj8.
+            command = [sys.executable, os.path.realpath(__file__), builddir] + passthrough + \
+                      ['-j', str(jobs)]
+            start = time.time()
+            with open(log, 'w') as fp:
+                status = subprocess.call(command, cwd=cwd, stdout=fp, stderr=subprocess.STDOUT)
+            print("{}: {} {}".format(tree, builddir, 'ok' if status == 0 else 'FAILED'))
+            binary = os.path.join(cwd, builddir, 'dist', 'bin', 'js')
+            results.append((builddir, status, time.time() - start,
+                            binary if os.path.exists(binary) else '-', log))
+        return results
+
+    print("Building {} in {} trees with -j{} each.".format(' '.join(args.builddirs), len(trees), jobs))
+    results = lib.parallel_map(build_tree, trees, len(trees))
+
+    failed = False
+    print("{:16} | {:24} | {:>6} | {:>8} | {}".format('tree', 'context', 'status', 'time', 'shell'))
+    for tree, rows in zip(trees, results):
+        for builddir, status, elapsed, binary, log in rows:
+            print("{:16} | {:24} | {:>6} | {:>7.0f}s | {}".format(
+                  tree, builddir, 'ok' if status == 0 else 'FAILED', elapsed, binary))
+            if status != 0:
+                print("{:16} | {:24} | log: {}".format('', '', log))
+                failed = True
+    return 1 if failed else 0
+
+
+def hg(*args):
+    return subprocess.check_output(['hg'] + list(args)).decode('UTF-8').strip()
+
+
+def median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    if len(values) % 2:
+        return values[mid]
+    return (values[mid - 1] + values[mid]) / 2.0
+
+
+def first_parent_chain(good, bad):
+    """
+    Return the revisions from |good| to |bad| following first parents only, so
+    that they form a line we can bisect even across merges.
+    """
+    good = hg('log', '-r', good, '--template', '{node}')
+    bad = hg('log', '-r', bad, '--template', '{node}')
+    output = hg('log', '-r', '{}::{}'.format(good, bad), '--template', '{node} {p1node}\n')
+    parents = dict(line.split() for line in output.splitlines())
+
+    chain = [bad]
+    while chain[-1] != good:
+        if chain[-1] not in parents:
+            raise Exception("{} is not a first-parent ancestor of {}".format(good[:12], bad[:12]))
+        chain.append(parents[chain[-1]])
+    return [node[:12] for node in reversed(chain)]
+
+
+def run_benchmark(shell, suite, metric, runs):
+    """
+    Run the benchmark in directory |suite| |runs| times and return the values
+    it reported for |metric|.
+    """
+    values = []
+    for i in range(runs):
+        output = subprocess.check_output([shell, 'run.js'], cwd=suite).decode('UTF-8')
+        results = dict(compare.asPairs(output.splitlines()))
+        if metric not in results:
+            raise Exception("Benchmark did not report {}; it reported: {}".format(
+                            metric, ', '.join(results.keys())))
+        values.append(float(results[metric]))
+    return values
+
+
+def perf_bisect(builder, args, extra, artifacts):
+    """
+    Find the first revision between GOOD and BAD at which the benchmark metric
+    moved from its GOOD value to its BAD value.
+    """
+    if lib.source_revision() is None:
+        raise Exception("Performance bisection needs a source tree without local changes.")
+
+    good, bad = args.perf_bisect
+    revisions = first_parent_chain(good, bad)
+    if len(revisions) < 2:
+        raise Exception("No revisions between {} and {}".format(good, bad))
+
+    shell = os.path.realpath(os.path.join(builder.builddir, 'dist', 'bin', 'js'))
+    suite = os.path.realpath(args.bench)
+    steps = []
+
+    def measure(index, runs):
+        revision = revisions[index]
+        builder.banner("Measuring: " + revision)
+        hg('update', '-q', '-r', revision)
+        if needs_autoconf():
+            autoconf()
+        update_context(builder, args, list(extra), artifacts)
+        values = run_benchmark(shell, suite, args.metric, runs)
+        print("{}: {}".format(args.metric, ' '.join('{:g}'.format(v) for v in values)))
+        return values
+
+    def spread(values):
+        return (max(values) - min(values)) / 2.0
+
+    def show_steps():
+        builder.banner("Performance bisection: " + args.metric)
+        for revision, values, verdict in steps:
+            if not values:
+                print("{:12} | {:>5} | failed to build or run".format(revision, verdict))
+                continue
+            print("{:12} | {:>5} | median {:>10g} | min {:>10g} | max {:>10g}".format(
+                  revision, verdict, median(values), min(values), max(values)))
+
+    original = hg('id', '-i')
+    try:
+        good_values = measure(0, args.runs)
+        steps.append((revisions[0], good_values, 'good'))
+        bad_values = measure(len(revisions) - 1, args.runs)
+        steps.append((revisions[-1], bad_values, 'bad'))
+        good_median, bad_median = median(good_values), median(bad_values)
+
+        # Refuse to bisect a change that is smaller than the threshold or that
+        # does not stand out of the run-to-run noise.
+        if good_median == 0:
+            raise Exception("{} is 0 at {}; cannot measure a relative change.".format(
+                            args.metric, revisions[0]))
+        change = (bad_median - good_median) / good_median * 100.0
+        noise = max(spread(good_values), spread(bad_values))
+        if abs(change) < args.threshold:
+            raise Exception("{} changed by {:+.2f}%, less than the {}% threshold.".format(
+                            args.metric, change, args.threshold))
+        if abs(bad_median - good_median) <= 2 * noise:
+            raise Exception("Good and bad measurements overlap; rerun with more --runs.")
+
+        # Like hg bisect --skip, a revision that does not build or run is left
+        # out and we try the untested revision closest to the middle instead.
+        midpoint = (good_median + bad_median) / 2.0
+        lo, hi = 0, len(revisions) - 1
+        skipped = set()
+        while True:
+            candidates = [i for i in range(lo + 1, hi) if i not in skipped]
+            if not candidates:
+                break
+            mid = min(candidates, key=lambda i: abs(i - (lo + hi) // 2))
+            try:
+                values = measure(mid, args.runs)
+
+                # Close to the midpoint we cannot tell; take another set of runs.
+                if abs(median(values) - midpoint) < noise:
+                    print("Inconclusive, measuring again.")
+                    values += measure(mid, args.runs)
+            except Exception as e:
+                print("Skipping {}: {}".format(revisions[mid], e))
+                skipped.add(mid)
+                steps.append((revisions[mid], [], 'skip'))
+                continue
+
+            is_bad = (median(values) - midpoint) * (bad_median - good_median) > 0
+            steps.append((revisions[mid], values, 'bad' if is_bad else 'good'))
+            if is_bad:
+                hi = mid
+            else:
+                lo = mid
+    except Exception:
+        show_steps()
+        raise
+    finally:
+        hg('update', '-q', '-r', original.rstrip('+'))
+
+    show_steps()
+    print("")
+    if hi - lo > 1:
+        print("Skipped revisions hide the first bad revision; it is one of:")
+        for revision in revisions[lo + 1:hi + 1]:
+            print(hg('log', '-r', revision))
+        return
+    print("The first bad revision is:")
+    print(hg('log', '-r', revisions[hi]))
 
 
 def main():
@@ -455,8 +1326,42 @@ def main():
                         help='Run all tests.')
     parser.add_argument('--filter', '-f', default='', type=str,
                         help='Filter tests.')
+    parser.add_argument('--affected', '-a', action='store_true',
+                        help='Only run the jit-tests affected by the current diff.')
     parser.add_argument('--debugger', '-g', action='store_true',
                         help='Run in a debugger.')
+    parser.add_argument('--perf-bisect', metavar=('GOOD', 'BAD'), nargs=2,
+                        help='Bisect a benchmark regression between two revisions.')
+    parser.add_argument('--bench', metavar='SUITE', type=str,
+                        help='Directory of the benchmark to bisect with; runs run.js.')
+    parser.add_argument('--metric', metavar='NAME', type=str,
+                        help='The benchmark result to bisect on.')
+    parser.add_argument('--runs', metavar='count', default=5, type=int,
+                        help='Benchmark runs per revision.')
+    parser.add_argument('--threshold', metavar='PERCENT', default=2.0, type=float,
+                        help='Smallest change worth bisecting.')
+    parser.add_argument('--compile-report', metavar='CONTEXT', nargs='+',
+                        help='Report the slowest compiles of a .ccprof context, or compare two.')
+    parser.add_argument('--test-timeout', metavar='SECONDS', default=DefaultTestTimeout, type=int,
+                        help='Kill a single test after this long.')
+    parser.add_argument('--suite-timeout', metavar='SECONDS', default=DefaultSuiteTimeout, type=int,
+                        help='Kill a whole test suite after this long.')
+    parser.add_argument('--ramdir', action='store_true',
+                        help='Keep the objdirs of new contexts in RAM.')
+    parser.add_argument('--ramdir-path', metavar='PATH', default=DefaultRamDir, type=str,
+                        help='Where to keep RAM objdirs (default {}).'.format(DefaultRamDir))
+    parser.add_argument('--ramdir-budget', metavar='GB', default=0, type=float,
+                        help='Rehydrate a RAM objdir that grows beyond this size.')
+    parser.add_argument('--trees', metavar='NAMES', type=str,
+                        help="Build in these comma separated trees of the branch directory, or 'all'.")
+    parser.add_argument('--branch-dir', metavar='PATH', default='~/moz/branch', type=str,
+                        help='The directory holding the trees for --trees.')
+    parser.add_argument('--no-clone', action='store_true',
+                        help='Start new contexts empty instead of cloning the closest one.')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always build, never restore artifacts from the cache.')
+    parser.add_argument('--cache-size', metavar='GB', default=cache.DefaultSizeGB, type=float,
+                        help='Size limit of the artifact cache.')
     args, extra = parser.parse_known_args()
 
     # Propogate all_tests to individual test routines.
@@ -466,7 +1371,26 @@ def main():
     # Handle --test.
     if args.test:
         cfg = ConfigParser(args.test)
-        cfg.show()
+        try:
+            cfg.show()
+        except ParseError:
+            return 1
+        return 0
+
+    # Handle --trees.
+    if args.trees is not None:
+        return build_trees(args)
+
+    # Handle --compile-report.
+    if args.compile_report:
+        for builddir in args.compile_report:
+            if not os.path.exists(os.path.join(builddir, '.wfm', ccprof.LogName)):
+                print("{} was not built with .ccprof; there is nothing to report.".format(builddir))
+                return 1
+        if len(args.compile_report) == 1:
+            ccprof.report(args.compile_report[0])
+        else:
+            ccprof.compare(*args.compile_report[:2])
         return 0
 
     # Check for configure.
@@ -486,27 +1410,85 @@ def main():
         autoconf()
 
     # Generate builders.
-    builders = [BuilderClass(builddir) for builddir in args.builddirs]
+    builders = [BuilderClass(builddir, args.test_timeout, args.suite_timeout)
+                for builddir in args.builddirs]
 
-    # Configure and build each directory in order.
+    # A context we cannot parse would configure with only part of its flags.
     for builder in builders:
-        # Configure if needed.
-        if builder.needs_configure():
-            builder.configure()
+        try:
+            ConfigParser(builder.builddir).parse()
+        except ParseError:
+            return 1
 
-        # Do the build.
-        builder.build(args.verbose, args.jobs, extra)
+    # Configure and build each directory in order.
+    artifacts = None if args.no_cache else cache.ArtifactCache(args.cache_size)
+
+    if args.perf_bisect:
+        if len(builders) != 1 or BuilderClass is not SpiderMonkeyBuilder:
+            print("Performance bisection needs exactly one SpiderMonkey context.")
+            return 1
+        if not args.bench or not args.metric:
+            print("Performance bisection needs --bench and --metric.")
+            return 1
+        perf_bisect(builders[0], args, extra, artifacts)
+        return 0
+
+    # Clone before anything builds, so that no clone sees a half-built objdir.
+    for builder in builders:
+        builder.setup_ramdir(args.ramdir_path if args.ramdir else None, args.ramdir_budget)
+        if not args.no_clone:
+            builder.clone_nearest()
+
+    # Configure is single threaded, so configure every context at once while
+    # the first one builds. Resource samples of overlapping phases include
+    # each other's processes.
+    quiet = len(builders) > 1
+    failed = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(builders) or 1) as pool:
+        prepared = [pool.submit(prepare_context, builder, args, artifacts, quiet)
+                    for builder in builders]
+        for builder, future in zip(builders, prepared):
+            try:
+                fingerprint = future.result()
+            except Exception as e:
+                if not quiet:
+                    raise
+                failed.append((builder, e))
+                continue
+            if fingerprint is not False:
+                build_context(builder, args, extra, artifacts, fingerprint)
+    builders = [builder for builder in builders if builder not in [b for b, _ in failed]]
 
     # Run tests as requested.
     # Note: after all builds so the output is easy to find.
     for builder in builders:
-        if args.jsapi_tests: builder.jsapi_tests(args.debugger, args.filter)
-        if args.check_style: builder.check_style()
-        if args.jit_tests:   builder.jit_tests(args.filter)
-        if args.js_tests:    builder.js_tests()
-        if args.mfbt_tests:  builder.mfbt_tests(args.filter)
+        if args.jsapi_tests:
+            with builder.monitor('jsapi-tests'): builder.jsapi_tests(args.debugger, args.filter, args.jobs)
+        if args.check_style:
+            with builder.monitor('check-style'): builder.check_style()
+        if args.jit_tests:
+            with builder.monitor('jit-tests'):   builder.jit_tests(args.filter, args.affected)
+        if args.js_tests:
+            with builder.monitor('js-tests'):    builder.js_tests()
+        if args.mfbt_tests:
+            with builder.monitor('mfbt-tests'):  builder.mfbt_tests(args.filter)
+
+    for builder in builders:
+        if builder.resources:
+            builder.show_resources()
+
+    if failed:
+        print("Configure failed:")
+        for builder, e in failed:
+            print("\t{}: {}".format(builder.builddir, e))
+
+    timed_out = [(b.builddir, key) for b in builders for key in b.timed_out]
+    if timed_out:
+        print("Timed out:")
+        for builddir, key in timed_out:
+            print("\t{}: {}".format(builddir, key))
 
-    return 0
+    return 1 if failed or timed_out else 0
 
 if __name__ == '__main__':
     sys.exit(main())